@@ -1,8 +1,9 @@
 import base64
 import hashlib
-import hmac
 import time
 
+SHA256_BLOCK_SIZE = 64
+
 
 class GdaxAuth:
     # Provided by gdax: https://docs.gdax.com/#signing-a-message
@@ -10,14 +11,27 @@ class GdaxAuth:
         self.api_key = api_key
         self.secret_key = secret_key
         self.passphrase = passphrase
+        # HMAC-SHA256 with the key schedule done once: the inner/outer hashes are
+        # primed with the padded key here and copied for every signature
+        hmac_key = base64.b64decode(secret_key)
+        if len(hmac_key) > SHA256_BLOCK_SIZE:
+            hmac_key = hashlib.sha256(hmac_key).digest()
+        hmac_key = hmac_key.ljust(SHA256_BLOCK_SIZE, b'\0')
+        self._inner = hashlib.sha256(bytes(b ^ 0x36 for b in hmac_key))
+        self._outer = hashlib.sha256(bytes(b ^ 0x5c for b in hmac_key))
 
     def get_signature(self, method, path_url, body=None):
-        timestamp = str(round(time.time()))
-        message = '{}{}{}{}'.format(timestamp, method, path_url, body if body else '')
-        message = message.encode('ascii')
-        hmac_key = base64.b64decode(self.secret_key)
-        signature = hmac.new(hmac_key, message, hashlib.sha256)
-        signature_b64 = base64.b64encode(signature.digest())
+        timestamp = str(time.time_ns() // 1000000000)
+        if not body:
+            body = b''
+        elif isinstance(body, str):
+            body = body.encode('ascii')
+        message = b''.join((timestamp.encode('ascii'), method.encode('ascii'), path_url.encode('ascii'), body))
+        inner = self._inner.copy()
+        inner.update(message)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        signature_b64 = base64.b64encode(outer.digest())
         return signature_b64, timestamp
 
     def get_ws_headers(self, method, path_url, body=None):
@@ -1,13 +1,11 @@
-import functools
-import json
 import logging
 
 import tornado.ioloop
-from tornado.concurrent import return_future
 from tornado.httpclient import AsyncHTTPClient, HTTPRequest
 from tornado.httputil import url_concat
 
 from gdax_async.auth import GdaxAuth
+from gdax_async.utils import json_loads
 
 
 class AsyncGdaxClient:
@@ -18,8 +16,7 @@ class AsyncGdaxClient:
 		self.http_client = AsyncHTTPClient(io_loop=io_loop)
 		self.api_url = api_url
 
-	@return_future
-	def request(self, endpoint, args=None, callback=None, method="GET", headers=None, body=None, **kwargs):
+	async def request(self, endpoint, args=None, method="GET", headers=None, body=None, **kwargs):
 		path_url = endpoint
 		if args:
 			path_url = url_concat(path_url, args)
@@ -29,15 +26,14 @@ class AsyncGdaxClient:
 		if headers:
 			auth_headers.update(headers)
 		request = HTTPRequest(url=full_url, method=method, headers=auth_headers, body=body, **kwargs)
-		self.http_client.fetch(request, functools.partial(self.handle_response, callback))
+		response = await self.http_client.fetch(request, raise_error=False)
+		return self.handle_response(response)
 
-	def handle_response(self, callback, response):
+	def handle_response(self, response):
 		headers = response.headers
 		try:
-			text = response.body.decode('utf-8')
-			data = json.loads(text)
+			data = json_loads(response.body)
 		except Exception as e:
 			logging.error('Unable to parse response as json: %s', response)
 			data = None
-		if callback:
-			callback({'data': data, 'headers': headers})
+		return {'data': data, 'headers': headers}
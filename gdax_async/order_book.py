@@ -3,26 +3,47 @@ import datetime
 import json
 import logging
 
-from decimal import Decimal
-from bintrees import RBTree
+from sortedcontainers import SortedDict
 
 from gdax_async.auth import GdaxAuth
 from gdax_async.client import AsyncGdaxClient
-from gdax_async.websocket import QuickWSClient
+from gdax_async.utils import parse_ts
+from gdax_async.websocket import WSClient
 
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
+PRICE_SCALE = 8
+FIXED_ONE = 10 ** PRICE_SCALE
+
+
+def to_fixed(value: str) -> int:
+	# prices, sizes and funds are quoted with at most 8 decimal places, so they are kept as ints scaled by 10^8
+	whole, _, frac = value.partition('.')
+	return int(whole + frac[:PRICE_SCALE].ljust(PRICE_SCALE, '0'))
+
+
+def from_fixed(value: int) -> float:
+	return value / FIXED_ONE
+
+
 class Side(Enum):
 	BUY = 1
 	SELL = -1
 
 
+SIDE_MAP = {'buy': Side.BUY, 'sell': Side.SELL}
+
+
 class MissingSequencesException(Exception):
 	pass
 
 
 class Order:
-	def __init__(self, time: datetime.datetime, sequence: int, product_id: str, order_id: str, order_type: str, side: Side, price: Decimal, size: Decimal, funds: Decimal=None):
+	__slots__ = ('time', 'sequence', 'product_id', 'order_id', 'order_type', 'side', 'price', 'size', 'funds', 'level', 'prev', 'next')
+
+	def __init__(self, time: datetime.datetime, sequence: int, product_id: str, order_id: str, order_type: str, side: Side, price: int, size: int, funds: int=None):
 		self.time = time
 		self.sequence = sequence
 		self.product_id = product_id
@@ -32,6 +53,10 @@ class Order:
 		self.price = price
 		self.size = size
 		self.funds = funds
+		# links within the PriceLevel this order is resting in
+		self.level = None
+		self.prev = None
+		self.next = None
 
 	def to_dict(self):
 		return {
@@ -41,49 +66,104 @@ class Order:
 			'order_id': self.order_id,
 			'order_type': self.order_type,
 			'side': self.side,
-			'price': self.price,
-			'size': self.size,
-			'funds': self.funds
+			'price': from_fixed(self.price) if self.price is not None else None,
+			'size': from_fixed(self.size) if self.size is not None else None,
+			'funds': from_fixed(self.funds) if self.funds is not None else None
 		}
 	
 	def __repr__(self):
 		if self.order_type == 'market':
-			size = (self.size or 0) * self.side.value
-			funds = (self.funds or 0) * self.side.value
+			size = from_fixed(self.size or 0) * self.side.value
+			funds = from_fixed(self.funds or 0) * self.side.value
 			return 'Order {} {} {:+6.3f} {:.2f}'.format(self.product_id, self.order_type, size, funds)
 		else:
-			return 'Order {} {} {:+6.3f}@{:.2f}'.format(self.product_id, self.order_type, self.size*self.side.value, self.price)
+			return 'Order {} {} {:+6.3f}@{:.2f}'.format(self.product_id, self.order_type, from_fixed(self.size)*self.side.value, from_fixed(self.price))
+
+
+class PriceLevel:
+	# FIFO queue of the orders resting at one price, linked through Order.prev/Order.next so any order unlinks in O(1)
+	__slots__ = ('head', 'tail', 'count')
+
+	def __init__(self):
+		self.head = None
+		self.tail = None
+		self.count = 0
+
+	def append(self, order: Order):
+		order.level = self
+		order.prev = self.tail
+		order.next = None
+		if self.tail is None:
+			self.head = order
+		else:
+			self.tail.next = order
+		self.tail = order
+		self.count += 1
+
+	def remove(self, order: Order):
+		if order.level is not self:
+			return
+		if order.prev is None:
+			self.head = order.next
+		else:
+			order.prev.next = order.next
+		if order.next is None:
+			self.tail = order.prev
+		else:
+			order.next.prev = order.prev
+		order.level = order.prev = order.next = None
+		self.count -= 1
+
+	def __len__(self):
+		return self.count
+
+	def __iter__(self):
+		order = self.head
+		while order is not None:
+			yield order
+			order = order.next
 
 
 class OrderBook:
-	LARGE_THRESHOLD = 50000
+	# notional in quote currency, scaled for the product of two fixed-point values
+	LARGE_THRESHOLD = 50000 * FIXED_ONE * FIXED_ONE
 	def __init__(self, product_id):
 		self.product_id = product_id
 
-		self._asks = RBTree()
-		self._bids = RBTree()
+		self._asks = SortedDict()
+		self._bids = SortedDict()
 		self._order_id_to_order = dict()
 		self._order_id_to_unreflected_order = dict()
 
 		self.pending_order_book_snapshot = False
 
 		self._sequence = -1
-		self.snapshots = collections.deque()
+		# sequence of the last applied snapshot; the raw snapshot itself is not kept once applied
+		self.snapshot_sequence = None
 		self.message_queue = collections.deque()
 
+		self._message_handlers = {
+			'open': self.apply_open,
+			'done': self.apply_done,
+			'match': self.apply_match,
+			'change': self.apply_change,
+			'received': self.apply_received,
+		}
+
 	def set_pending_order_book_snapshot(self):
 		self.pending_order_book_snapshot = True
-		logging.debug('Pending order book snapshot for {}'.format(self.product_id))
+		logger.debug('Pending order book snapshot for {}'.format(self.product_id))
 
 	def on_order_book_snapshot(self, result):
 		data = result['data']
-		logging.info('Order Book Snapshot received for {} {}'.format(self.product_id, data['sequence']))
+		logger.info('Order Book Snapshot received for {} {}'.format(self.product_id, data['sequence']))
 
-		self.snapshots.append(data)
 		self.apply_order_book_snapshot(snapshot=data)
+		self.snapshot_sequence = data['sequence']
 
-		while self.message_queue:
-			message = self.message_queue.popleft()
+		messages = list(self.message_queue)
+		self.message_queue.clear()
+		for message in messages:
 			self.update_order_book(message)
 		self.pending_order_book_snapshot = False
 
@@ -95,13 +175,13 @@ class OrderBook:
 			order_type='limit',
 			product_id=self.product_id,
 			side=side,
-			price=Decimal(snapshot_order[0]),
-			size=Decimal(snapshot_order[1]),
+			price=to_fixed(snapshot_order[0]),
+			size=to_fixed(snapshot_order[1]),
 		)
 
 	def apply_order_book_snapshot(self, snapshot):
-		self._asks = RBTree()
-		self._bids = RBTree()
+		self._asks = SortedDict()
+		self._bids = SortedDict()
 		self._order_id_to_order = dict()
 		sequence = snapshot['sequence']
 		for snapshot_order in snapshot['bids']:
@@ -118,147 +198,156 @@ class OrderBook:
 		elif sequence > self._sequence + 1:
 			raise Exception('Error: {} order book missing {} messages ({} - {}).'.format(self.product_id, sequence-self._sequence, sequence, self._sequence))
 
-		msg_type = message['type']
-		if msg_type == 'open':
-			time = datetime.datetime.strptime(message['time'], "%Y-%m-%dT%H:%M:%S.%fZ")
-			sequence = message['sequence']
-			order_id = message['order_id']
-			size = Decimal(message['remaining_size'])
-			unreflected_order = self._order_id_to_unreflected_order.get(order_id)
-			if unreflected_order:
-				#logging.debug('Opening unreflected order: order_id={}'.format(unreflected_order.order_id))
-				order = unreflected_order
-				order.time = time
-				order.sequence = sequence
-				order.size = size
-				del self._order_id_to_unreflected_order[order_id]
-			else:
-				order = Order(
-					time=time,
-					sequence=sequence,
-					product_id=message['product_id'],
-					order_id=order_id,
-					order_type='limit',
-					side=Side.BUY if message['side'] == 'buy' else Side.SELL,
-					price=Decimal(message['price']),
-					size=size,
-				)
-			self.add(order=order, message=message)
-		elif msg_type == 'done' and 'price' in message:
-			order_id = message['order_id']
-			reason = message['reason']
-			price = Decimal(message['price'])
-			side = Side.BUY if message['side'] == 'buy' else Side.SELL
-			remaining_size = Decimal(message['remaining_size'])
-			time = datetime.datetime.strptime(message['time'], "%Y-%m-%dT%H:%M:%S.%fZ")
-			sequence = message['sequence']
-			self.remove(order_id=order_id, time=time, sequence=sequence, side=side, price=price, remaining_size=remaining_size, reason=reason, message=message)
-		elif msg_type == 'match':
-			'''
-			{
-				"type": "match",
-				"trade_id": 10,
-				"sequence": 50,
-				"maker_order_id": "ac928c66-ca53-498f-9c13-a110027a60e8",
-				"taker_order_id": "132fb6ae-456b-4654-b4e0-d681ac05cea1",
-				"time": "2014-11-07T08:19:27.028459Z",
-				"product_id": "BTC-USD",
-				"size": "5.23512",
-				"price": "400.23",
-				"side": "sell"
-			}
-			taker_user_id: "5844eceecf7e803e259d0365",
-			user_id: "5844eceecf7e803e259d0365",
-			taker_profile_id: "765d1549-9660-4be2-97d4-fa2d65fa3352",
-			profile_id: "765d1549-9660-4be2-97d4-fa2d65fa3352"
-			'''
-			time = datetime.datetime.strptime(message['time'], "%Y-%m-%dT%H:%M:%S.%fZ")
-			sequence = message['sequence']
-			maker_order_id = message['maker_order_id']
-			taker_order_id = message['taker_order_id']
-			trade_id = message['trade_id']
-			price = Decimal(message['price'])
-			side = Side.BUY if message['side'] == 'buy' else Side.SELL
-			size = Decimal(message['size'])
-			# taker_user_id = message['taker_user_id']
-			# maker_user_id = message['user_id']
-			# taker_profile_id = message['taker_profile_id']
-			# maker_profile_id = message['profile_id']
-			# logging.debug('Match IDs {} {} {} {}'.format(maker_user_id, taker_user_id, maker_profile_id, taker_profile_id))
-			self.match(time=time, sequence=sequence, trade_id=trade_id, maker_order_id=maker_order_id, taker_order_id=taker_order_id, side=side, price=price, size=size, message=message)
-		elif msg_type == 'change':
-			'''
-			{
-				"type": "change",
-				"time": "2014-11-07T08:19:27.028459Z",
-				"sequence": 80,
-				"order_id": "ac928c66-ca53-498f-9c13-a110027a60e8",
-				"product_id": "BTC-USD",
-				"new_size": "5.23512",
-				"old_size": "12.234412",
-				"price": "400.23",
-				"side": "sell"
-			}
-			'''
-			time = datetime.datetime.strptime(message['time'], "%Y-%m-%dT%H:%M:%S.%fZ")
-			sequence = message['sequence']
-			order_id = message['order_id']
-			price = Decimal(message['price'])
-			side = Side.BUY if message['side'] == 'buy' else Side.SELL
-			new_size = Decimal(message['new_size'])
-			old_size = Decimal(message['old_size'])
-			self.change(time=time, sequence=sequence, order_id=order_id, price=price, side=side, new_size=new_size, old_size=old_size, message=message)
-		elif msg_type == 'received':
-			'''
-			{
-				"type": "received",
-				"time": "2014-11-07T08:19:27.028459Z",
-				"product_id": "BTC-USD",
-				"sequence": 10,
-				"order_id": "d50ec984-77a8-460a-b958-66f114b0de9b",
-				"size": "1.34",
-				"price": "502.1",
-				"side": "buy",
-				"order_type": "limit"
-			}
-			'''
-			order_type = message['order_type']
-			funds = message.get('funds')
-			if order_type == 'market':
-				price = None
-				size = Decimal(message['size']) if message.get('size') else None
-				funds = Decimal(funds) if funds else None
-			elif order_type == 'limit':
-				size = Decimal(message['size'])
-				price = Decimal(message['price'])
-			else:
-				size = Decimal(message.get('size'))
-				price = Decimal(message.get('price'))
+		handler = self._message_handlers.get(message['type'])
+		if handler:
+			handler(message)
+
+		self._sequence = sequence
+
+	def apply_open(self, message):
+		time = parse_ts(message['time'])
+		sequence = message['sequence']
+		order_id = message['order_id']
+		size = to_fixed(message['remaining_size'])
+		unreflected_order = self._order_id_to_unreflected_order.pop(order_id, None)
+		if unreflected_order:
+			#logger.debug('Opening unreflected order: order_id={}'.format(unreflected_order.order_id))
+			order = unreflected_order
+			order.time = time
+			order.sequence = sequence
+			order.size = size
+		else:
 			order = Order(
-				time=datetime.datetime.strptime(message['time'], "%Y-%m-%dT%H:%M:%S.%fZ"),
-				sequence=message['sequence'],
+				time=time,
+				sequence=sequence,
 				product_id=message['product_id'],
-				order_id=message['order_id'],
-				order_type=order_type,
-				side=Side.BUY if message['side'] == 'buy' else Side.SELL,
-				price=price,
+				order_id=order_id,
+				order_type='limit',
+				side=SIDE_MAP[message['side']],
+				price=to_fixed(message['price']),
 				size=size,
-				funds=funds
 			)
-			self.received(order=order, order_type=order_type, message=message)
+		self.add(order=order, message=message)
 
-		self._sequence = sequence
+	def apply_done(self, message):
+		if 'price' not in message:
+			return
+		order_id = message['order_id']
+		reason = message['reason']
+		price = to_fixed(message['price'])
+		side = SIDE_MAP[message['side']]
+		remaining_size = to_fixed(message['remaining_size'])
+		time = parse_ts(message['time'])
+		sequence = message['sequence']
+		self.remove(order_id=order_id, time=time, sequence=sequence, side=side, price=price, remaining_size=remaining_size, reason=reason, message=message)
+
+	def apply_match(self, message):
+		'''
+		{
+			"type": "match",
+			"trade_id": 10,
+			"sequence": 50,
+			"maker_order_id": "ac928c66-ca53-498f-9c13-a110027a60e8",
+			"taker_order_id": "132fb6ae-456b-4654-b4e0-d681ac05cea1",
+			"time": "2014-11-07T08:19:27.028459Z",
+			"product_id": "BTC-USD",
+			"size": "5.23512",
+			"price": "400.23",
+			"side": "sell"
+		}
+		taker_user_id: "5844eceecf7e803e259d0365",
+		user_id: "5844eceecf7e803e259d0365",
+		taker_profile_id: "765d1549-9660-4be2-97d4-fa2d65fa3352",
+		profile_id: "765d1549-9660-4be2-97d4-fa2d65fa3352"
+		'''
+		time = parse_ts(message['time'])
+		sequence = message['sequence']
+		maker_order_id = message['maker_order_id']
+		taker_order_id = message['taker_order_id']
+		trade_id = message['trade_id']
+		price = to_fixed(message['price'])
+		side = SIDE_MAP[message['side']]
+		size = to_fixed(message['size'])
+		# taker_user_id = message['taker_user_id']
+		# maker_user_id = message['user_id']
+		# taker_profile_id = message['taker_profile_id']
+		# maker_profile_id = message['profile_id']
+		# logger.debug('Match IDs {} {} {} {}'.format(maker_user_id, taker_user_id, maker_profile_id, taker_profile_id))
+		self.match(time=time, sequence=sequence, trade_id=trade_id, maker_order_id=maker_order_id, taker_order_id=taker_order_id, side=side, price=price, size=size, message=message)
+
+	def apply_change(self, message):
+		'''
+		{
+			"type": "change",
+			"time": "2014-11-07T08:19:27.028459Z",
+			"sequence": 80,
+			"order_id": "ac928c66-ca53-498f-9c13-a110027a60e8",
+			"product_id": "BTC-USD",
+			"new_size": "5.23512",
+			"old_size": "12.234412",
+			"price": "400.23",
+			"side": "sell"
+		}
+		'''
+		time = parse_ts(message['time'])
+		sequence = message['sequence']
+		order_id = message['order_id']
+		price = to_fixed(message['price'])
+		side = SIDE_MAP[message['side']]
+		new_size = to_fixed(message['new_size'])
+		old_size = to_fixed(message['old_size'])
+		self.change(time=time, sequence=sequence, order_id=order_id, price=price, side=side, new_size=new_size, old_size=old_size, message=message)
+
+	def apply_received(self, message):
+		'''
+		{
+			"type": "received",
+			"time": "2014-11-07T08:19:27.028459Z",
+			"product_id": "BTC-USD",
+			"sequence": 10,
+			"order_id": "d50ec984-77a8-460a-b958-66f114b0de9b",
+			"size": "1.34",
+			"price": "502.1",
+			"side": "buy",
+			"order_type": "limit"
+		}
+		'''
+		order_type = message['order_type']
+		funds = message.get('funds')
+		if order_type == 'market':
+			price = None
+			size = to_fixed(message['size']) if message.get('size') else None
+			funds = to_fixed(funds) if funds else None
+		elif order_type == 'limit':
+			size = to_fixed(message['size'])
+			price = to_fixed(message['price'])
+		else:
+			size = to_fixed(message.get('size'))
+			price = to_fixed(message.get('price'))
+		order = Order(
+			time=parse_ts(message['time']),
+			sequence=message['sequence'],
+			product_id=message['product_id'],
+			order_id=message['order_id'],
+			order_type=order_type,
+			side=SIDE_MAP[message['side']],
+			price=price,
+			size=size,
+			funds=funds
+		)
+		self.received(order=order, order_type=order_type, message=message)
 
 	def received(self, order: Order, order_type: str, message):
 		self._order_id_to_unreflected_order[order.order_id] = order
 		self.on_received(order=order, order_type=order_type, message=message)
 
 	def on_received(self, order: Order, order_type: str, message):
-		pass
+		if not logger.isEnabledFor(logging.DEBUG):
+			return
 		if order_type == 'market':
-			logging.debug('Received {} {} {:+6.3f} funds={:.2f} order_id={} '.format(order_type, order.side, order.side.value*(order.size or 0), order.side.value*(order.funds or 0), order.order_id))
+			logger.debug('Received {} {} {:+6.3f} funds={:.2f} order_id={} '.format(order_type, order.side, order.side.value*from_fixed(order.size or 0), order.side.value*from_fixed(order.funds or 0), order.order_id))
 		else:
-			logging.debug('Received {} {:+6.3f}@{:.2f} order_id={} '.format(order_type, order.size*order.side.value, order.price, order.order_id))
+			logger.debug('Received {} {:+6.3f}@{:.2f} order_id={} '.format(order_type, from_fixed(order.size)*order.side.value, from_fixed(order.price), order.order_id))
 
 	def on_message(self, message):
 		if self.pending_order_book_snapshot:
@@ -270,133 +359,124 @@ class OrderBook:
 		if order.side == Side.BUY:
 			bids = self.get_bids(order.price)
 			if bids is None:
-				bids = [order]
+				bids = PriceLevel()
 				self.set_bids(order.price, bids)
-			else:
-				bids.append(order)
+			bids.append(order)
 		else:
 			asks = self.get_asks(order.price)
 			if asks is None:
-				asks = [order]
+				asks = PriceLevel()
 				self.set_asks(order.price, asks)
-			else:
-				asks.append(order)
+			asks.append(order)
 		self._order_id_to_order[order.order_id] = order
 		self.on_add(order=order, message=message)
 
 	def on_add(self, order: Order, message):
-		pass
-		latency_seconds = None
-		if order.time:
-			latency = datetime.datetime.utcnow()-order.time
-			latency_seconds = latency.seconds+latency.microseconds/1000000
-		logging.debug('Added {:+6.3f}@{:.2f} order_id={} latency={}'.format(order.side.value*order.size, order.price, order.order_id, latency_seconds))
+		if logger.isEnabledFor(logging.DEBUG):
+			latency_seconds = None
+			if order.time:
+				latency = datetime.datetime.utcnow()-order.time
+				latency_seconds = latency.seconds+latency.microseconds/1000000
+			logger.debug('Added {:+6.3f}@{:.2f} order_id={} latency={}'.format(order.side.value*from_fixed(order.size), from_fixed(order.price), order.order_id, latency_seconds))
 		if order.size*order.price > self.LARGE_THRESHOLD:
-			logging.info('Large order: {:+6.3f}@{:.2f} {} order_id={}'.format(order.side.value*order.size, order.price, self.product_id, order.order_id))
+			logger.info('Large order: {:+6.3f}@{:.2f} {} order_id={}'.format(order.side.value*from_fixed(order.size), from_fixed(order.price), self.product_id, order.order_id))
 
-	def remove(self, time: datetime.datetime, sequence: int, order_id: str, side: Side, price: Decimal, remaining_size: Decimal, reason: str, message=None):
-		order = self._order_id_to_order.get(order_id)
+	def remove(self, time: datetime.datetime, sequence: int, order_id: str, side: Side, price: int, remaining_size: int, reason: str, message=None):
+		order = self._order_id_to_order.pop(order_id, None)
 		if not order:
-			unreflected_order = self._order_id_to_unreflected_order.get(order_id)
+			unreflected_order = self._order_id_to_unreflected_order.pop(order_id, None)
 			if unreflected_order:
-				logging.debug('Removing unreflected order_id={}'.format(order_id))
-				del self._order_id_to_unreflected_order[order_id]
+				logger.debug('Removing unreflected order_id={}'.format(order_id))
 			else:
-				logging.error('Trying to remove unrecognized order_id={} side={} price={} remaining_size={} reason={}'.format(order_id, side, price, remaining_size, reason))
+				logger.error('Trying to remove unrecognized order_id={} side={} price={} remaining_size={} reason={}'.format(order_id, side, from_fixed(price), from_fixed(remaining_size), reason))
 			return
 		if side != order.side:
-			logging.error('Trying to remove order with inconsistent side order_id={} done_side={} known_side={}'.format(order_id, side, order.side))
+			logger.error('Trying to remove order with inconsistent side order_id={} done_side={} known_side={}'.format(order_id, side, order.side))
 		if price != order.price:
-			logging.error('Trying to remove order with inconsistent price order_id={} done_price={} known_price={}'.format(order_id, price, order.price))
+			logger.error('Trying to remove order with inconsistent price order_id={} done_price={} known_price={}'.format(order_id, from_fixed(price), from_fixed(order.price)))
 
 		if side == Side.BUY:
 			bids = self.get_bids(price)
 			if bids is not None:
-				bids = [o for o in bids if o.order_id != order_id]
-				if len(bids) > 0:
-					self.set_bids(price, bids)
-				else:
+				bids.remove(order)
+				if not bids:
 					self.remove_bids(price)
 		else:
 			asks = self.get_asks(price)
 			if asks is not None:
-				asks = [o for o in asks if o.order_id != order_id]
-				if len(asks) > 0:
-					self.set_asks(price, asks)
-				else:
+				asks.remove(order)
+				if not asks:
 					self.remove_asks(price)
-		del self._order_id_to_order[order_id]
 		self.on_remove(order=order, time=time, sequence=sequence, remaining_size=remaining_size, reason=reason, message=message)
 
-	def on_remove(self, order: Order, time: datetime.datetime, sequence: int, remaining_size: Decimal, reason: str, message):
-		pass
-		latency_seconds = None
-		if time:
-			latency = datetime.datetime.utcnow()-time
-			latency_seconds = latency.seconds+latency.microseconds/1000000
-		logging.debug('Removed {:+6.3f}@{:.2f} {} order_id={} latency={}'.format(order.size, order.price, reason, order.order_id, latency_seconds))
+	def on_remove(self, order: Order, time: datetime.datetime, sequence: int, remaining_size: int, reason: str, message):
+		if logger.isEnabledFor(logging.DEBUG):
+			latency_seconds = None
+			if time:
+				latency = datetime.datetime.utcnow()-time
+				latency_seconds = latency.seconds+latency.microseconds/1000000
+			logger.debug('Removed {:+6.3f}@{:.2f} {} order_id={} latency={}'.format(from_fixed(order.size), from_fixed(order.price), reason, order.order_id, latency_seconds))
 		if remaining_size*order.price > self.LARGE_THRESHOLD:
-			logging.info('Large cancel: {:+6.3f}@{:.2f} {} order_id={}'.format(order.side.value*order.size, order.price, self.product_id, order.order_id))
+			logger.info('Large cancel: {:+6.3f}@{:.2f} {} order_id={}'.format(order.side.value*from_fixed(order.size), from_fixed(order.price), self.product_id, order.order_id))
 
-	def match(self, time: datetime.datetime, sequence: int, side: Side, price: Decimal, size: Decimal, trade_id: str, maker_order_id:str, taker_order_id:str, message=None):
+	def match(self, time: datetime.datetime, sequence: int, side: Side, price: int, size: int, trade_id: str, maker_order_id:str, taker_order_id:str, message=None):
 		maker_order = self._order_id_to_order.get(maker_order_id)
 		if maker_order:
 			pass # we should receive Done to confirm removal of filled passive order
 		else:
-			logging.error('Unable to find maker order for trade: {} {} {}'.format(time, sequence, maker_order_id))
+			logger.error('Unable to find maker order for trade: {} {} {}'.format(time, sequence, maker_order_id))
 		taker_order = self._order_id_to_unreflected_order.get(taker_order_id) # or self._order_id_to_order.get(taker_order_id)
 		if taker_order:
 			if taker_order.size:
 				taker_order.size -= size
 				if taker_order.size <= 0:
 					del self._order_id_to_unreflected_order[taker_order_id]
-					logging.debug('Matched taker fully filled order_id={}'.format(taker_order.order_id))
+					logger.debug('Matched taker fully filled order_id={}'.format(taker_order.order_id))
 				else:
 					pass
-					logging.debug('Matched taker size={} remaining size={} order_id={}'.format(size, taker_order.size, taker_order.order_id))
+					logger.debug('Matched taker size={} remaining size={} order_id={}'.format(from_fixed(size), from_fixed(taker_order.size), taker_order.order_id))
 			else:
 				del self._order_id_to_unreflected_order[taker_order_id]
-				logging.debug('Taker order with no size removed order_id={}'.format(taker_order.order_id))
+				logger.debug('Taker order with no size removed order_id={}'.format(taker_order.order_id))
 		else:
-			logging.error('Unable to find taker order for trade: {} {} {}'.format(time, sequence, taker_order_id))
-		if side == 'buy':
+			logger.error('Unable to find taker order for trade: {} {} {}'.format(time, sequence, taker_order_id))
+		if side == Side.BUY:
 			bids = self.get_bids(price)
 			if not bids:
 				return
-			assert bids[0].order_id == maker_order_id
-			if bids[0].size == size:
-				self.set_bids(price, bids[1:])
+			assert bids.head.order_id == maker_order_id
+			if bids.head.size == size:
+				bids.remove(bids.head)
 			else:
-				bids[0].size -= size
-				self.set_bids(price, bids)
+				bids.head.size -= size
 		else:
 			asks = self.get_asks(price)
 			if not asks:
 				return
-			assert asks[0].order_id == maker_order_id
-			if asks[0].size == size:
-				self.set_asks(price, asks[1:])
+			assert asks.head.order_id == maker_order_id
+			if asks.head.size == size:
+				asks.remove(asks.head)
 			else:
-				asks[0].size -= size
-				self.set_asks(price, asks)
+				asks.head.size -= size
 
 		self.on_match(message=message, time=time, sequence=sequence, side=side, price=price, size=size, trade_id=trade_id, maker_order_id=maker_order_id, taker_order_id=taker_order_id, maker_order=maker_order)
 
-	def on_match(self, time: datetime.datetime, sequence: int, side: Side, price: Decimal, size: Decimal, trade_id: str, maker_order_id:str, taker_order_id:str, maker_order: Order, message):
-		pass
+	def on_match(self, time: datetime.datetime, sequence: int, side: Side, price: int, size: int, trade_id: str, maker_order_id:str, taker_order_id:str, maker_order: Order, message):
+		if not logger.isEnabledFor(logging.INFO):
+			return
 		latency_seconds = None
 		if time:
 			latency = datetime.datetime.utcnow()-time
 			latency_seconds = latency.seconds+latency.microseconds/1000000
-		logging.info('Trade: {:+6.3f}@{:.2f} {} mkt: {:.2f} / {:.2f} {} maker={} taker={} latency={}'.format(side.value*-1*size, price, self.product_id, self.get_bid(), self.get_ask(), time.isoformat(), maker_order_id, taker_order_id, latency_seconds))
+		logger.info('Trade: {:+6.3f}@{:.2f} {} mkt: {:.2f} / {:.2f} {} maker={} taker={} latency={}'.format(side.value*-1*from_fixed(size), from_fixed(price), self.product_id, from_fixed(self.get_bid()), from_fixed(self.get_ask()), time.isoformat(), maker_order_id, taker_order_id, latency_seconds))
 
-	def change(self, time: datetime.datetime, sequence: int, order_id: str, side: Side, price: Decimal, old_size: Decimal, new_size: Decimal, message=None):
+	def change(self, time: datetime.datetime, sequence: int, order_id: str, side: Side, price: int, old_size: int, new_size: int, message=None):
 		order = self._order_id_to_order.get(order_id)
 		if not order:
-			logging.error('Trying to change unrecognized order_id={} side={} price={} old_size={} old_size={}'.format(order_id, side, price, old_size, new_size))
+			logger.error('Trying to change unrecognized order_id={} side={} price={} old_size={} old_size={}'.format(order_id, side, from_fixed(price), from_fixed(old_size), from_fixed(new_size)))
 			return
 		if order.size != old_size:
-			logging.error('Trying to change order but old_size={} does not match order size={} for order_id={}'.format(old_size, order.size, order_id))
+			logger.error('Trying to change order but old_size={} does not match order size={} for order_id={}'.format(from_fixed(old_size), from_fixed(order.size), order_id))
 		order.size = new_size
 		# if side == Side.BUY:
 		# 	bids = self.get_bids(price)
@@ -425,43 +505,39 @@ class OrderBook:
 
 		self.on_change(time=time, sequence=sequence, order=order, old_size=old_size, new_size=new_size, message=message)
 
-	def on_change(self, time: datetime.datetime, sequence: int, order: Order, old_size: Decimal, new_size: Decimal, message=None):
-		pass
-		lookup = None
-		level = self.get_asks(price=order.price) if order.side == Side.SELL else self.get_bids(price=order.price)
-		for o in level:
-			if o.order_id == order.order_id:
-				lookup = o
-		logging.debug('Change: order_id={} old_size={} new_size={} order_size={} lookup={}'.format(order.order_id, old_size, new_size, order.size, o))
+	def on_change(self, time: datetime.datetime, sequence: int, order: Order, old_size: int, new_size: int, message=None):
+		if not logger.isEnabledFor(logging.DEBUG):
+			return
+		logger.debug('Change: order_id={} old_size={} new_size={} order_size={} order={}'.format(order.order_id, from_fixed(old_size), from_fixed(new_size), from_fixed(order.size), order))
 
 
 	def get_ask(self):
-		return self._asks.min_key()
+		return self._asks.peekitem(0)[0]
 
 	def get_asks(self, price):
 		return self._asks.get(price)
 
 	def remove_asks(self, price):
-		self._asks.remove(price)
+		del self._asks[price]
 
 	def set_asks(self, price, asks):
-		self._asks.insert(price, asks)
+		self._asks[price] = asks
 
 	def get_bid(self):
-		return self._bids.max_key()
+		return self._bids.peekitem(-1)[0]
 
 	def get_bids(self, price):
 		return self._bids.get(price)
 
 	def remove_bids(self, price):
-		self._bids.remove(price)
+		del self._bids[price]
 
 	def set_bids(self, price, bids):
-		self._bids.insert(price, bids)
+		self._bids[price] = bids
 
 
 class OrderBookManager:
-	def __init__(self, gdax_auth: GdaxAuth, ws_client: QuickWSClient, async_gdax_client: AsyncGdaxClient):
+	def __init__(self, gdax_auth: GdaxAuth, ws_client: WSClient, async_gdax_client: AsyncGdaxClient):
 		self.gdax_auth = gdax_auth
 		self.ws_client = ws_client
 		self.ws_client.register_callback(callback=self.on_message)
@@ -478,21 +554,23 @@ class OrderBookManager:
 		self.product_id_to_order_book[product_id] = order_book
 		self.subscribe(product_id=product_id)
 
-	def fetch_order_book_snapshot(self, order_book: OrderBook, async_gdax_client: AsyncGdaxClient):
+	async def fetch_order_book_snapshot(self, order_book: OrderBook, async_gdax_client: AsyncGdaxClient):
 		params = {"level": "3"}
-		logging.info('Requesting Order Book Snapshot for {}'.format(order_book.product_id))
-		order_book.set_pending_order_book_snapshot()
-		async_gdax_client.request(endpoint='/products/{}/book'.format(order_book.product_id), method='GET', args=params, callback=order_book.on_order_book_snapshot)
+		logger.info('Requesting Order Book Snapshot for {}'.format(order_book.product_id))
+		result = await async_gdax_client.request(endpoint='/products/{}/book'.format(order_book.product_id), method='GET', args=params)
+		order_book.on_order_book_snapshot(result)
 
-	def on_message(self, message, ws_client: QuickWSClient):
+	def on_message(self, message, ws_client: WSClient):
 		product_id = message['product_id']
 		order_book = self.get_order_book(product_id)
 		if order_book:
-			if not order_book.snapshots and not order_book.pending_order_book_snapshot:
-				self.fetch_order_book_snapshot(order_book=order_book, async_gdax_client=self.async_gdax_client)
+			if order_book.snapshot_sequence is None and not order_book.pending_order_book_snapshot:
+				# marked pending here, not in the fetch, so this message and the ones after it are queued for the snapshot
+				order_book.set_pending_order_book_snapshot()
+				self.ws_client.io_loop.spawn_callback(self.fetch_order_book_snapshot, order_book=order_book, async_gdax_client=self.async_gdax_client)
 			order_book.on_message(message=message)
 		else:
-			logging.warning('Received message for unregistered product {}'.format(product_id))
+			logger.warning('Received message for unregistered product {}'.format(product_id))
 
 	def subscribe(self, product_id):
 		if not self.ws_client.ws:
@@ -505,7 +583,7 @@ class OrderBookManager:
 		}
 		ws_sub_request.update(self.gdax_auth.get_ws_headers(method='GET', path_url='/users/self'))
 		ws_sub_request['signature'] = ws_sub_request['signature'].decode('ascii')
-		logging.debug('Subscribing to WS: {}'.format(ws_sub_request))
+		logger.debug('Subscribing to WS: {}'.format(ws_sub_request))
 		self.ws_client.ws.write_message(json.dumps(ws_sub_request))
 
 
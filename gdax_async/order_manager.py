@@ -1,13 +1,21 @@
 import logging
 import collections
-import datetime
 import json
 import pprint
-from decimal import Decimal
-from tornado.concurrent import return_future
+from tornado.gen import convert_yielded
 from gdax_async.auth import GdaxAuth
 from gdax_async.client import AsyncGdaxClient
-from gdax_async.order_book import OrderBook, Order, Side
+from gdax_async.utils import parse_ts
+from gdax_async.order_book import OrderBook, Order, SIDE_MAP, to_fixed
+
+
+def next_page_after(result):
+	# a full page of 100 means more results may be waiting behind the Cb-After cursor
+	data = result['data']
+	cb_after = result['headers'].get('Cb-After')
+	if data and len(data) > 99 and cb_after:
+		return cb_after
+	return None
 
 
 class PositionManager:
@@ -20,8 +28,8 @@ class PositionManager:
 		self.status = None
 		self.accounts = None
 
-	def example(self):
-		result = yield self.async_gdax_client.request(endpoint='/fills')
+	async def example(self):
+		result = await self.async_gdax_client.request(endpoint='/fills')
 		logging.info('Fills Response: {}'.format(result))
 
 		params = {
@@ -34,11 +42,12 @@ class PositionManager:
 			"time_in_force": "GTT",
 			"post_only": "True"
 		}
-		result = yield self.async_gdax_client.request(endpoint='/orders', method='POST', body=json.dumps(params))
+		result = await self.async_gdax_client.request(endpoint='/orders', method='POST', body=json.dumps(params))
 		logging.info('Place Order Response: {}'.format(result))
 
-	def fetch_positions(self):
-		self.async_gdax_client.request(endpoint='/position', callback=self.on_positions)
+	async def fetch_positions(self):
+		result = await self.async_gdax_client.request(endpoint='/position')
+		self.on_positions(result)
 
 	def on_positions(self, result):
 		data = result['data']
@@ -63,42 +72,46 @@ class OrderManager:
 		self.order_id_to_fills = collections.OrderedDict()
 		self.trade_id_to_fill = collections.OrderedDict()
 
-	def fetch_orders(self, before=None, after=None):
+	async def fetch_orders(self, before=None, after=None):
 		args = {}
 		if before:
 			args['before'] = before
 		if after:
 			args['after'] = after
-		self.async_gdax_client.request(endpoint='/orders', args=args if args else None, callback=self.on_orders)
+		page = convert_yielded(self.async_gdax_client.request(endpoint='/orders', args=args if args else None))
+		while page is not None:
+			result = await page
+			# pages are chained by cursor, so the next one can only be requested once this one is back;
+			# it is put in flight before this page is processed
+			cb_after = next_page_after(result)
+			page = convert_yielded(self.async_gdax_client.request(endpoint='/orders', args={'after': cb_after})) if cb_after else None
+			self.on_orders(result)
 
 	def on_orders(self, result):
 		data = result['data']
 		headers = result['headers']
 		cb_before = headers.get('Cb-Before')
 		cb_after = headers.get('Cb-After')
-		requesting_after = False
-		if len(data) > 99 and cb_after:
-			requesting_after = True
-			self.fetch_orders(after=cb_after)
+		requesting_after = next_page_after(result) is not None
 
 		logging.info('Orders Response: len={} before={} after={} requesting_after={}'.format(len(data), cb_before, cb_after, requesting_after))
 		for message in data:
 			order_id = message['id']
 			status = message['status']
 			tif = message.get('time_in_force')
-			filled_size = Decimal(message.get('filled_size'))
-			size = Decimal(message.get('size'))
+			filled_size = to_fixed(message.get('filled_size'))
+			size = to_fixed(message.get('size'))
 			if filled_size and size:
 				size -= filled_size
-			price = Decimal(message.get('price'))
-			time = datetime.datetime.strptime(message['created_at'], "%Y-%m-%dT%H:%M:%S.%fZ")
+			price = to_fixed(message.get('price'))
+			time = parse_ts(message['created_at'])
 			order = Order(
 				sequence=None,
 				order_id=order_id,
 				product_id=message['product_id'],
 				time=time,
 				order_type=message['type'],
-				side=Side.BUY if message['side'] == 'buy' else Side.SELL,
+				side=SIDE_MAP[message['side']],
 				price=price,
 				size=size
 			)
@@ -113,23 +126,27 @@ class OrderManager:
 				self.order_id_to_open_order[order_id] = order_item
 			logging.info('Order status: {} {} {} {} {}'.format(order, status, tif, order.order_id, order.time))
 
-	def fetch_fills(self, before=None, after=None):
+	async def fetch_fills(self, before=None, after=None):
 		args = {}
 		if before:
 			args['before'] = before
 		if after:
 			args['after'] = after
-		self.async_gdax_client.request(endpoint='/fills', args=args if args else None, callback=self.on_fills)
+		page = convert_yielded(self.async_gdax_client.request(endpoint='/fills', args=args if args else None))
+		while page is not None:
+			result = await page
+			# pages are chained by cursor, so the next one can only be requested once this one is back;
+			# it is put in flight before this page is processed
+			cb_after = next_page_after(result)
+			page = convert_yielded(self.async_gdax_client.request(endpoint='/fills', args={'after': cb_after})) if cb_after else None
+			self.on_fills(result)
 
 	def on_fills(self, result):
 		data = result['data']
 		headers = result['headers']
 		cb_before = headers.get('Cb-Before')
 		cb_after = headers.get('Cb-After')
-		requesting_after = False
-		if len(data) > 99 and cb_after:
-			requesting_after = True
-			self.fetch_fills(after=cb_after)
+		requesting_after = next_page_after(result) is not None
 		logging.info('Fills Response: len={} before={} after={} requesting_after={}\n{}'.format(len(data), cb_before, cb_after, requesting_after, pprint.pformat(data)))
 
 		'''
@@ -155,7 +172,7 @@ class OrderManager:
 			self.trade_id_to_fill[trade_id] = message
 
 
-	def place_order(self):
+	async def place_order(self):
 		params = {
 			#"client_oid": "",
 			"size": "0.01",
@@ -166,5 +183,5 @@ class OrderManager:
 			"time_in_force": "GTT",
 			"post_only": "True"
 		}
-		result = yield self.async_gdax_client.request(endpoint='/orders', method='POST', body=json.dumps(params))
+		result = await self.async_gdax_client.request(endpoint='/orders', method='POST', body=json.dumps(params))
 		logging.info('Place Order Response: {}'.format(result))
\ No newline at end of file
@@ -4,11 +4,22 @@ import logging
 import datetime
 from logging.handlers import TimedRotatingFileHandler
 
+try:
+	import orjson
+	json_loads = orjson.loads
+except ImportError:
+	json_loads = json.loads
+
+
+def parse_ts(s):
+	# fixed-layout ISO-8601 UTC timestamp, e.g. 2014-11-07T08:19:27.028459Z or 2017-06-30T21:28:24.148Z
+	return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]), int(s[20:-1].ljust(6, '0')) if len(s) > 20 else 0)
+
 
 def load_config(path):
-	with open(path) as f:
-		data = f.read()
-		return json.loads(data)
+	# both parsers accept the raw bytes, so the file is not decoded first
+	with open(path, 'rb') as f:
+		return json_loads(f.read())
 
 
 class MicroFormatter(logging.Formatter):
@@ -1,121 +1,186 @@
-import datetime
-import json
 import logging
 import time
 
 import tornado.httpclient
-from tornado import gen
 from tornado.websocket import websocket_connect
 
+from gdax_async.utils import json_loads
+
+logger = logging.getLogger(__name__)
+
+# heartbeat frames may arrive as text or binary
+HEARTBEAT = 'HEARTBEAT'
+HEARTBEAT_BYTES = b'HEARTBEAT'
+
+# allow frames above tornado's default 10MiB limit
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+TYPE_PREFIX = '{"type":"'
+
+
+def message_type(message):
+	# feed frames open with their "type" key; for any other layout this returns None and the parsed type is used
+	if not message.startswith(TYPE_PREFIX):
+		return None
+	end = message.find('"', len(TYPE_PREFIX))
+	if end < 0:
+		return None
+	return message[len(TYPE_PREFIX):end]
+
+
+class WSClient:
+	# batched callbacks receive at most this many messages per call, see flush_pending
+	MAX_BATCH = 128
+
+	__slots__ = ('url', 'io_loop', 'reconnect_timeout', 'ws', 'last_heartbeat', '_ws_request', 'callbacks', '_dispatch', '_callback', '_callbacks_tuple', '_callbacks_by_type', '_pending', '_pending_count', '_flush_scheduled')
 
-class DispatcherWSClient:
 	def __init__(self, url, io_loop, reconnect_timeout=0):
 		self.url = url
 		self.io_loop = io_loop
 		self.reconnect_timeout = reconnect_timeout
 		self.ws = None
+		# websocket_connect re-copies the headers and rewrites its handshake fields on each call, so one request serves every reconnect
+		self._ws_request = tornado.httpclient.HTTPRequest(url)
 		self.last_heartbeat = None
 
-		self.callbacks = dict()
+		# name -> (callback, type_filter, batch)
+		self.callbacks = {}
+		# frames that arrive before register_callback are dropped
+		self._dispatch = self._dispatch_none
+		self._callback = None
+		self._callbacks_tuple = ()
+		self._callbacks_by_type = {}
+		self._pending = {}
+		self._pending_count = 0
+		self._flush_scheduled = False
 
-	def register_callback(self, name, callback):
+	def register_callback(self, callback, name=None, type_filter=None, batch=False):
+		# type_filter: a message type or collection of types the callback wants; None receives everything
+		# batch: call the callback with the list of messages that arrived in the same loop iteration instead of one at a time
+		if not callable(callback):
+			raise Exception('Callback {!r} is not callable'.format(callback))
+		if name is None:
+			name = callback
 		if name in self.callbacks:
 			raise Exception('Callback with name "{}" already registered'.format(name))
-		self.callbacks[name] = callback
+		if isinstance(type_filter, str):
+			type_filter = (type_filter,)
+		self.callbacks[name] = (callback, frozenset(type_filter) if type_filter is not None else None, batch)
+		self._build_dispatch()
+
+	def _build_dispatch(self):
+		# the dispatcher is picked here so handle_websocket_message always makes the same call
+		targets = []
+		filtered_types = set()
+		for callback, type_filter, batch in self.callbacks.values():
+			targets.append((self._batcher(callback) if batch else callback, type_filter))
+			if type_filter:
+				filtered_types.update(type_filter)
+		self._callbacks_tuple = tuple(target for target, type_filter in targets if type_filter is None)
+		self._callbacks_by_type = {
+			msg_type: tuple(target for target, type_filter in targets if type_filter is None or msg_type in type_filter)
+			for msg_type in filtered_types
+		}
+		if len(targets) == 1 and targets[0][1] is None:
+			self._callback = targets[0][0]
+			self._dispatch = self._dispatch_single
+		else:
+			self._callback = None
+			self._dispatch = self._dispatch_many
+
+	def _batcher(self, callback):
+		def queue(data, ws_client):
+			self.queue_message(callback, data)
+		return queue
 
-	@gen.coroutine
-	def connect(self, callback=None):
-		logging.debug('Connecting to ws: %s', self.url)
+	async def connect(self, callback=None):
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug('Connecting to ws: %s', self.url)
 		if self.ws:
 			self.ws.close()
-		request = tornado.httpclient.HTTPRequest(self.url)
-		self.ws = yield websocket_connect(request, io_loop=self.io_loop, on_message_callback=self.handle_websocket_message)
+		self.ws = await websocket_connect(self._ws_request, io_loop=self.io_loop, on_message_callback=self.handle_websocket_message, compression_options={}, max_message_size=MAX_MESSAGE_SIZE)
 		if self.ws:
-			logging.debug('WS connected: %s', self.url)
+			if logger.isEnabledFor(logging.DEBUG):
+				logger.debug('WS connected: %s', self.url)
 			if callback:
 				callback(self)
 			return self.ws
 		else:
-			logging.debug('WS connection failed: %s', self.url)
+			if logger.isEnabledFor(logging.DEBUG):
+				logger.debug('WS connection failed: %s', self.url)
 			return None
 
 	def handle_websocket_message(self, message):
-		try:
+		# JSON frames are the common case, so they are recognised by their first character before the rarer checks
+		if not (message and message[0] == '{'):
 			if message is None:
 				if self.reconnect_timeout > 0:
-					logging.warning('Websocket {} disconnected. Attempting to reconnect in 10s.'.format(self.url))
-					self.io_loop.add_timeout(time.time()+10, self.connect)
-					return
+					logger.warning('Websocket %s disconnected. Attempting to reconnect in 10s.', self.url)
+					self.io_loop.call_later(10, self.connect)
 				else:
-					logging.warning('Websocket {} disconnected.'.format(self.url))
-			elif message == 'HEARTBEAT':
-				self.last_heartbeat = datetime.datetime.now()
-			else:
-				try:
-					data = json.loads(message)
-				except:
-					data = message
-				for name, callback in self.callbacks.items():
-					callback(data, self)
-				#logging.debug('WS data: %s', data)
+					logger.warning('Websocket %s disconnected.', self.url)
+				return
+			if message == HEARTBEAT or message == HEARTBEAT_BYTES:
+				self.last_heartbeat = time.monotonic()
+				return
+		try:
+			self._dispatch(message)
 		except Exception as e:
-			logging.exception('Cannot parse incoming websocket message with error: %s: \n%s', e, message)
-			return
+			logger.exception('Cannot parse incoming websocket message with error: %s: \n%s', e, message)
 
-	def close(self):
-		if self.ws:
-			self.ws.close()
-			# self.ws = None
+	def _dispatch_none(self, message):
+		pass
 
+	def _dispatch_single(self, message):
+		self._callback(json_loads(message), self)
 
-class QuickWSClient:
-	def __init__(self, url, io_loop, reconnect_timeout=0):
-		self.url = url
-		self.io_loop = io_loop
-		self.reconnect_timeout = reconnect_timeout
-		self.ws = None
-		self.last_heartbeat = None
-
-		self.callback = None
-
-	def register_callback(self, callback):
-		self.callback = callback
+	def _dispatch_many(self, message):
+		callbacks = None
+		# route on the raw "type" field first so frames that no callback wants are never parsed
+		if self._callbacks_by_type and isinstance(message, str):
+			msg_type = message_type(message)
+			if msg_type is not None:
+				callbacks = self._callbacks_by_type.get(msg_type, self._callbacks_tuple)
+				if not callbacks:
+					return
+		data = json_loads(message)
+		if callbacks is None:
+			callbacks = self._callbacks_by_type.get(data.get('type'), self._callbacks_tuple) if isinstance(data, dict) else self._callbacks_tuple
+		for callback in callbacks:
+			try:
+				callback(data, self)
+			except Exception as e:
+				logger.exception('Websocket callback failed with error: %s', e)
 
-	@gen.coroutine
-	def connect(self, callback=None):
-		logging.debug('Connecting to ws: %s', self.url)
-		if self.ws:
-			self.ws.close()
-		request = tornado.httpclient.HTTPRequest(self.url)
-		self.ws = yield websocket_connect(request, io_loop=self.io_loop, on_message_callback=self.handle_websocket_message)
-		if self.ws:
-			logging.debug('WS connected: %s', self.url)
-			if callback:
-				callback(self)
-			return self.ws
+	def queue_message(self, callback, data):
+		batch = self._pending.get(callback)
+		if batch is None:
+			self._pending[callback] = [data]
 		else:
-			logging.debug('WS connection failed: %s', self.url)
-			return None
+			batch.append(data)
+		self._pending_count += 1
+		if self._pending_count >= self.MAX_BATCH:
+			self.flush_pending()
+		elif not self._flush_scheduled:
+			self._flush_scheduled = True
+			self.io_loop.add_callback(self.flush_pending)
 
-	def handle_websocket_message(self, message):
-		try:
-			data = json.loads(message)
-			self.callback(data, self)
-		except Exception as e:
-			if message is None:
-				if self.reconnect_timeout > 0:
-					logging.warning('Websocket {} disconnected. Attempting to reconnect in 10s.'.format(self.url))
-					self.io_loop.add_timeout(time.time()+10, self.connect)
-					return
-				else:
-					logging.warning('Websocket {} disconnected.'.format(self.url))
-			elif message == 'HEARTBEAT':
-				self.last_heartbeat = datetime.datetime.now()
-			else:
-				logging.exception('Cannot parse incoming websocket message with error: %s: \n%s', e, message)
-				return
+	def flush_pending(self):
+		# frames that arrive in the same loop iteration are delivered together: each batched callback is called once with its list
+		self._flush_scheduled = False
+		if not self._pending:
+			return
+		pending = self._pending
+		self._pending = {}
+		self._pending_count = 0
+		for callback, batch in pending.items():
+			try:
+				callback(batch, self)
+			except Exception as e:
+				logger.exception('Websocket callback failed with error: %s', e)
 
 	def close(self):
 		if self.ws:
 			self.ws.close()
-			# self.ws = None
\ No newline at end of file
+			# self.ws = None
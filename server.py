@@ -1,4 +1,4 @@
-import json
+import asyncio
 import logging
 
 import tornado
@@ -7,30 +7,46 @@ import tornado.httpserver
 import tornado.httputil
 import tornado.ioloop
 import tornado.log
+import tornado.netutil
+import tornado.process
 import tornado.web
+from tornado import gen
 from gdax_async.auth import GdaxAuth
 from gdax_async.client import AsyncGdaxClient
 from gdax_async.utils import load_config, configure_logging
-from gdax_async.websocket import QuickWSClient
+from gdax_async.websocket import WSClient
 from tornado.options import define, options, parse_command_line
+from tornado.platform.asyncio import AsyncIOMainLoop
 
 from gdax_async.order_book import OrderBookManager
 from gdax_async.order_manager import PositionManager, OrderManager
 
+try:
+	import uvloop
+except ImportError:
+	uvloop = None
 
-@tornado.gen.coroutine
-def init_sequence(gdax_auth: GdaxAuth, async_gdax_client: AsyncGdaxClient, ws_client: QuickWSClient):
-	order_manager = OrderManager(gdax_auth=gdax_auth, async_gdax_client=async_gdax_client)
-	position_manager = PositionManager(gdax_auth=gdax_auth, async_gdax_client=async_gdax_client)
 
-	position_manager.fetch_positions()
-	order_manager.fetch_orders()
-	order_manager.fetch_fills()
-	order_manager.place_order()
+async def fetch_account_state(position_manager: PositionManager, order_manager: OrderManager):
+	# the REST fetches are independent of each other, so their round trips overlap
+	try:
+		await gen.multi([
+			position_manager.fetch_positions(),
+			order_manager.fetch_orders(),
+			order_manager.fetch_fills(),
+		])
+	except Exception as e:
+		logging.exception('Fetching account state failed with error: %s', e)
 
 
+async def init_sequence(gdax_auth: GdaxAuth, async_gdax_client: AsyncGdaxClient, ws_client: WSClient):
+	order_manager = OrderManager(gdax_auth=gdax_auth, async_gdax_client=async_gdax_client)
+	position_manager = PositionManager(gdax_auth=gdax_auth, async_gdax_client=async_gdax_client)
+
+	# the account fetches run alongside the websocket handshake and never hold up the order book feed
+	tornado.ioloop.IOLoop.current().spawn_callback(fetch_account_state, position_manager=position_manager, order_manager=order_manager)
 
-	result = yield ws_client.connect()
+	await ws_client.connect()
 	order_book_manager = OrderBookManager(ws_client=ws_client, async_gdax_client=async_gdax_client, gdax_auth=gdax_auth)
 	order_book_manager.init_order_book(product_id='ETH-USD')
 
@@ -43,20 +59,36 @@ def run():
 	define('file_log_level', type=str, default='DEBUG')
 	define('console_log_level', type=str, default='INFO')
 	define('log_file', type=str, default='logs/trader')
-	options.logging = None
-	parse_command_line()
-
-	configure_logging(log_file=options.log_file, file_log_level=options.file_log_level, console_log_level=options.console_log_level)
-	io_loop = tornado.ioloop.IOLoop()
+	# number of server processes sharing the port, 0 for one per CPU
+	define('processes', type=int, default=1)
+	# final=False skips the parse callbacks, so tornado does not install its own log handlers over configure_logging's
+	parse_command_line(final=False)
+
+	# the sockets are bound before forking so every worker accepts on the same port
+	sockets = tornado.netutil.bind_sockets(options.port)
+	task_id = None
+	if options.processes != 1:
+		task_id = tornado.process.fork_processes(options.processes)
+
+	# forked workers each rotate their own file, a shared one would be renamed under the others
+	log_file = options.log_file if task_id is None else '{}.{}'.format(options.log_file, task_id)
+	configure_logging(log_file=log_file, file_log_level=options.file_log_level, console_log_level=options.console_log_level)
+	# run tornado on top of asyncio, using uvloop's libuv-based loop when it is installed
+	if uvloop:
+		asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+	AsyncIOMainLoop().install()
+	io_loop = tornado.ioloop.IOLoop.current()
 
 	keys_config = load_config(options.keys_config)
 	api_config = load_config(options.api_config)
 
 	gdax_auth = GdaxAuth(api_key=keys_config.get('api_key'), secret_key=keys_config.get('secret_key'), passphrase=keys_config.get('passphrase'))
 	async_gdax_client = AsyncGdaxClient(io_loop=io_loop, gdax_auth=gdax_auth, api_url=api_config.get('api_url'))
-	ws_client = QuickWSClient(io_loop=io_loop, url=api_config.get('ws_url'))
+	ws_client = WSClient(io_loop=io_loop, url=api_config.get('ws_url'))
 
-	init_sequence(gdax_auth=gdax_auth, async_gdax_client=async_gdax_client, ws_client=ws_client)
+	# only one process keeps the exchange session; the other workers just serve http
+	if not task_id:
+		io_loop.spawn_callback(init_sequence, gdax_auth=gdax_auth, async_gdax_client=async_gdax_client, ws_client=ws_client)
 
 	handlers = [
 		tornado.web.url(r'/static/?(.*)?', tornado.web.StaticFileHandler,
@@ -67,7 +99,8 @@ def run():
 		'debug': False,
 	}
 	applicaton = tornado.web.Application(handlers, **settings)
-	applicaton.listen(options.port)
+	server = tornado.httpserver.HTTPServer(applicaton)
+	server.add_sockets(sockets)
 
 	try:
 		io_loop.start()